@@ -0,0 +1,196 @@
+"""
+Constants and helpers shared by the content pipeline scripts: the regions and categories shown
+by index.html, the batch rotation, fetched articles, API rate limiting, and JSON encoding and
+file I/O.
+"""
+import asyncio
+import json
+import mmap
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+try:
+    import orjson # Serializes straight to UTF-8 bytes in C, several times faster than json
+except ImportError: # Fall back to the standard library when orjson isn't installed
+    orjson = None
+
+# Define the regions (now country-specific) and categories that match your index.html
+REGIONS = {
+    "global": {"name": "the entire world", "country_codes": ["us", "gb", "ca", "au", "in", "de", "fr", "jp", "cn", "br", "za", "eg", "ae", "sg"]}, # Combined for global search
+    "us": {"name": "United States", "country_codes": ["us"]},
+    "gb": {"name": "United Kingdom", "country_codes": ["gb"]},
+    "ca": {"name": "Canada", "country_codes": ["ca"]},
+    "au": {"name": "Australia", "country_codes": ["au"]},
+    "in": {"name": "India", "country_codes": ["in"]},
+    "de": {"name": "Germany", "country_codes": ["de"]},
+    "fr": {"name": "France", "country_codes": ["fr"]},
+    "jp": {"name": "Japan", "country_codes": ["jp"]},
+    "cn": {"name": "China", "country_codes": ["cn"]},
+    "br": {"name": "Brazil", "country_codes": ["br"]},
+    "za": {"name": "South Africa", "country_codes": ["za"]},
+    "eg": {"name": "Egypt", "country_codes": ["eg"]},
+    "ae": {"name": "UAE", "country_codes": ["ae"]},
+    "sg": {"name": "Singapore", "country_codes": ["sg"]}
+}
+
+# Mapping internal categories to NewsAPI.org and World News API categories/keywords
+CATEGORIES = {
+    "news": {"newsapi_cat": "general", "newsapi_query_keyword": "general news", "worldnewsapi_query": "general news"},
+    "technology": {"newsapi_cat": "technology", "newsapi_query_keyword": "technology OR tech", "worldnewsapi_query": "technology OR tech"},
+    "finance": {"newsapi_cat": "business", "newsapi_query_keyword": "business OR finance OR economy", "worldnewsapi_query": "business OR finance OR economy"},
+    "travel": {"newsapi_cat": "general", "newsapi_query_keyword": "travel OR tourism", "worldnewsapi_query": "travel OR tourism"}, 
+    "world": {"newsapi_cat": "general", "newsapi_query_keyword": "world affairs OR international news", "worldnewsapi_query": "world affairs OR international news"},
+    "weather": {"newsapi_cat": "science", "newsapi_query_keyword": "weather OR climate", "worldnewsapi_query": "weather OR climate"}, 
+    "blogs": {"newsapi_cat": "general", "newsapi_query_keyword": "blogs OR opinion pieces", "worldnewsapi_query": "blogs OR opinion pieces"},
+    "automotive": {"newsapi_cat": "general", "newsapi_query_keyword": "automotive OR cars OR vehicles OR auto industry", "worldnewsapi_query": "automotive OR cars OR vehicles OR auto industry"}, 
+    "popular_social_contents": {"newsapi_cat": "general", "newsapi_query_keyword": "social media trends OR viral content OR internet culture", "worldnewsapi_query": "social media OR internet trends OR viral content OR memes"} 
+}
+
+# --- Constants for rotating processing ---
+# ALL_CATEGORY_KEYS now includes the new country-specific regions
+ALL_CATEGORY_KEYS = tuple((r_key, c_key) for r_key in REGIONS for c_key in CATEGORIES)
+TOTAL_CATEGORIES = len(ALL_CATEGORY_KEYS) 
+NUM_BATCHES = 6 # Runs every 4 hours (24/4 = 6 runs per day)
+HOURS_PER_BATCH = 24 // NUM_BATCHES
+BATCH_SIZE = 10 # Process 10 categories per run
+# The categories of each batch, precomputed so a run just indexes this by its batch index.
+BATCHES = tuple(ALL_CATEGORY_KEYS[i * BATCH_SIZE:(i + 1) * BATCH_SIZE] for i in range(NUM_BATCHES))
+
+# --- Articles ---
+
+@dataclass(slots=True)
+class RawArticle:
+    """
+    An article as fetched from a news API, before Mistral AI summarizes it.
+    Slotted, so the many in flight during a run carry no per-instance __dict__.
+    """
+    title: str
+    content_raw: str
+    link: str
+    imageUrl_raw: str | None
+
+# --- Rate limiting ---
+
+class AsyncRateLimiter:
+    """
+    Token-bucket rate limiter for asyncio code. Allows up to max_rate acquisitions per
+    time_period seconds: callers proceed immediately while tokens are left and only wait
+    for a refill once the budget is used up, instead of sleeping a fixed time per call.
+    A caller can take several tokens at once (e.g. an estimated token count), and pause()
+    holds back every caller, e.g. for the Retry-After of a 429 response.
+    """
+
+    def __init__(self, max_rate, time_period):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._tokens = max_rate
+        self._last_refill = None
+        self._paused_until = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.max_rate) # More than the whole budget waits for a full bucket
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self._last_refill is not None:
+                    refill = (now - self._last_refill) * self.max_rate / self.time_period
+                    self._tokens = min(self.max_rate, self._tokens + refill)
+                self._last_refill = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) * self.time_period / self.max_rate)
+
+    def pause(self, seconds):
+        """Holds back all acquisitions for the given number of seconds and empties the bucket, so
+        requests resume at the configured rate instead of in a burst."""
+        paused_until = asyncio.get_running_loop().time() + seconds
+        if paused_until > self._paused_until:
+            self._paused_until = paused_until
+            self._tokens = 0
+            self._last_refill = paused_until
+
+
+# --- Functions ---
+
+def get_current_batch_index():
+    """
+    Determines which batch of categories to process based on the current UTC hour.
+    Assumes workflow runs at 00:00, 04:00, 08:00, 12:00, 16:00, 20:00 UTC,
+    i.e. batch 0 for 00:00-03:59, batch 1 for 04:00-07:59, and so on.
+    """
+    return datetime.now(timezone.utc).hour // HOURS_PER_BATCH
+
+def get_current_batch_start():
+    """Returns the UTC time at which the current batch's window started, e.g. 08:00 for batch 2."""
+    now_utc = datetime.now(timezone.utc)
+    return now_utc.replace(hour=get_current_batch_index() * HOURS_PER_BATCH, minute=0, second=0, microsecond=0)
+
+def get_positive_int_env(name, default):
+    """
+    Reads a positive integer setting, such as a rate limit, from the environment. A limit of 0
+    would disable a rate limiter (or block every request behind a semaphore), so anything but
+    a positive integer is rejected at startup with a ValueError naming the variable.
+    """
+    value = os.getenv(name, str(default))
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise ValueError(f"{name} must be a positive integer, got {value!r}")
+    return number
+
+def json_loads(data):
+    """Parses JSON from bytes or str. Invalid input raises json.JSONDecodeError (which orjson's error subclasses)."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(data, indent=False):
+    """Serializes data to UTF-8 JSON bytes, compact or indented by two spaces."""
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else None)
+    if indent:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def read_json_file(path):
+    """
+    Reads and parses a JSON file in one go. With orjson the file is memory-mapped and parsed
+    straight from the page cache, without first copying its contents into a bytes object.
+    """
+    with open(path, 'rb') as f:
+        if not orjson or os.fstat(f.fileno()).st_size == 0: # An empty file can't be mapped
+            return json_loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            with memoryview(mapped_file) as view:
+                return orjson.loads(view)
+
+def write_file_atomically(path, data):
+    """
+    Writes bytes with a single write call to a uniquely named temporary file in the target's
+    directory that is then renamed over the target, so readers never see a half-written file
+    even if the run is killed mid-write, and concurrent writers never share a temporary file.
+    The data is fsynced before the rename, so a crash can't leave the new name pointing at
+    blocks that never reached the disk.
+    """
+    directory, file_name = os.path.split(os.path.abspath(path))
+    tmp_file = tempfile.NamedTemporaryFile('wb', dir=directory, prefix=f".{file_name}.", suffix='.tmp', delete=False)
+    try:
+        with tmp_file:
+            os.chmod(tmp_file.name, 0o644) # Temporary files are created owner-only
+            tmp_file.write(data)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_file.name, path)
+    except BaseException:
+        os.unlink(tmp_file.name)
+        raise
@@ -1,10 +1,39 @@
 import json
+import logging
 import os
-import random
-import time
-import requests
+import httpx
 import asyncio
-from datetime import datetime, timezone
+from collections import deque
+from urllib.parse import urlencode
+from datetime import datetime, timedelta, timezone
+
+from content_common import (
+    AsyncRateLimiter,
+    BATCHES,
+    CATEGORIES,
+    NUM_BATCHES,
+    REGIONS,
+    RawArticle,
+    get_current_batch_index,
+    get_current_batch_start,
+    json_dumps,
+    json_loads,
+    read_json_file,
+    write_file_atomically
+)
+from mistral_core import (
+    MISTRAL_MAX_ARTICLES_PER_REQUEST,
+    create_mistral_client,
+    get_cached_mistral_result,
+    get_mistral_summaries_and_images,
+    load_mistral_cache,
+    save_mistral_cache,
+    serialize_mistral_cache,
+    write_mistral_cache
+)
+
+# Per-request diagnostics are logged at DEBUG level; run with LOG_LEVEL=DEBUG to see them.
+logger = logging.getLogger(__name__)
 
 # --- API Keys Configuration ---
 # NewsAPI.org API key should be stored as a GitHub Secret named NEWSAPI_API_KEY.
@@ -16,10 +45,6 @@ NEWSAPI_BASE_URL = "https://newsapi.org/v2/"
 WORLD_NEWS_API_KEY = os.getenv('WORLD_NEWS_API_KEY')
 WORLD_NEWS_API_BASE_URL = "https://api.worldnewsapi.com/"
 
-# Mistral AI API key should be stored as a GitHub Secret named MISTRAL_API_KEY.
-MISTRAL_API_BASE_URL = "https://api.mistral.ai/v1/chat/completions"
-MISTRAL_API_KEY = os.getenv('MISTRAL_API_KEY') 
-
 # --- Debugging Print for API Keys ---
 if NEWSAPI_API_KEY:
     NEWSAPI_API_KEY = NEWSAPI_API_KEY.strip()
@@ -32,80 +57,116 @@ if WORLD_NEWS_API_KEY:
     print(f"WORLD_NEWS_API_KEY successfully loaded from environment. Length: {len(WORLD_NEWS_API_KEY)}. Starts with: {WORLD_NEWS_API_KEY[:5]}... Ends with: {WORLD_NEWS_API_KEY[-5:]}")
 else:
     print("WARNING: WORLD_NEWS_API_KEY is NOT loaded from environment. Please check GitHub Secrets and workflow env configuration.")
-
-if MISTRAL_API_KEY:
-    MISTRAL_API_KEY = MISTRAL_API_KEY.strip()
-    print(f"MISTRAL_API_KEY successfully loaded from environment. Length: {len(MISTRAL_API_KEY)}. Starts with: {MISTRAL_API_KEY[:5]}... Ends with: {MISTRAL_API_KEY[-5:]}")
-else:
-    print("WARNING: MISTRAL_API_KEY is NOT loaded from environment. Please check GitHub Secrets and workflow env configuration.")
 # --- End Debugging Print ---
 
-# Define the regions (now country-specific) and categories that match your index.html
-REGIONS = {
-    "global": {"name": "the entire world", "country_codes": ["us", "gb", "ca", "au", "in", "de", "fr", "jp", "cn", "br", "za", "eg", "ae", "sg"]}, # Combined for global search
-    "us": {"name": "United States", "country_codes": ["us"]},
-    "gb": {"name": "United Kingdom", "country_codes": ["gb"]},
-    "ca": {"name": "Canada", "country_codes": ["ca"]},
-    "au": {"name": "Australia", "country_codes": ["au"]},
-    "in": {"name": "India", "country_codes": ["in"]},
-    "de": {"name": "Germany", "country_codes": ["de"]},
-    "fr": {"name": "France", "country_codes": ["fr"]},
-    "jp": {"name": "Japan", "country_codes": ["jp"]},
-    "cn": {"name": "China", "country_codes": ["cn"]},
-    "br": {"name": "Brazil", "country_codes": ["br"]},
-    "za": {"name": "South Africa", "country_codes": ["za"]},
-    "eg": {"name": "Egypt", "country_codes": ["eg"]},
-    "ae": {"name": "UAE", "country_codes": ["ae"]},
-    "sg": {"name": "Singapore", "country_codes": ["sg"]}
-}
-
-# Mapping internal categories to NewsAPI.org and World News API categories/keywords
-CATEGORIES = {
-    "news": {"newsapi_cat": "general", "newsapi_query_keyword": "general news", "worldnewsapi_query": "general news"},
-    "technology": {"newsapi_cat": "technology", "newsapi_query_keyword": "technology OR tech", "worldnewsapi_query": "technology OR tech"},
-    "finance": {"newsapi_cat": "business", "newsapi_query_keyword": "business OR finance OR economy", "worldnewsapi_query": "business OR finance OR economy"},
-    "travel": {"newsapi_cat": "general", "newsapi_query_keyword": "travel OR tourism", "worldnewsapi_query": "travel OR tourism"}, 
-    "world": {"newsapi_cat": "general", "newsapi_query_keyword": "world affairs OR international news", "worldnewsapi_query": "world affairs OR international news"},
-    "weather": {"newsapi_cat": "science", "newsapi_query_keyword": "weather OR climate", "worldnewsapi_query": "weather OR climate"}, 
-    "blogs": {"newsapi_cat": "general", "newsapi_query_keyword": "blogs OR opinion pieces", "worldnewsapi_query": "blogs OR opinion pieces"},
-    "automotive": {"newsapi_cat": "general", "newsapi_query_keyword": "automotive OR cars OR vehicles OR auto industry", "worldnewsapi_query": "automotive OR cars OR vehicles OR auto industry"}, 
-    "popular_social_contents": {"newsapi_cat": "general", "newsapi_query_keyword": "social media trends OR viral content OR internet culture", "worldnewsapi_query": "social media OR internet trends OR viral content OR memes"} 
-}
-
 # --- Constants for incremental update ---
 MAX_ARTICLES_PER_CATEGORY = 30 
 ARTICLES_TO_FETCH_PER_RUN = 8 # Number of articles to try and fetch/process for each category
-
-# --- Constants for rotating processing ---
-# ALL_CATEGORY_KEYS now includes the new country-specific regions
-ALL_CATEGORY_KEYS = [(r_key, c_key) for r_key in REGIONS for c_key in CATEGORIES]
-TOTAL_CATEGORIES = len(ALL_CATEGORY_KEYS) 
-NUM_BATCHES = 6 # Runs every 4 hours (24/4 = 6 runs per day)
-BATCH_SIZE = 10 # Process 10 categories per run
+# A full category whose newest article was fetched less than this long ago is skipped, so a re-run
+# of the same batch (manual dispatch, retried job) doesn't spend API calls to evict one article.
+CATEGORY_FRESHNESS_HOURS = 4
+
+# Set FORCE_RUN=true to process the current batch even if a run already completed it.
+FORCE_RUN = os.getenv('FORCE_RUN', '').strip().lower() in ('1', 'true', 'yes')
+
+# --- News API rate limits ---
+# Shared by every concurrently processed category, so the request rate stays within each API's
+# limits without a fixed sleep after every attempt.
+NEWSAPI_MAX_REQUESTS_PER_SECOND = 5
+WORLD_NEWS_API_MAX_REQUESTS_PER_SECOND = 1 # World News API's free plan allows one request per second
+newsapi_rate_limiter = AsyncRateLimiter(NEWSAPI_MAX_REQUESTS_PER_SECOND, 1)
+worldnewsapi_rate_limiter = AsyncRateLimiter(WORLD_NEWS_API_MAX_REQUESTS_PER_SECOND, 1)
+
+# --- News API conditional requests ---
+# ETag / Last-Modified validators are stored per category and request, and sent back on the next
+# run so unchanged results come back as 304 Not Modified. They are stored only once every article
+# of the response was summarized and merged, so a 304 means the results are already in updates.json.
+NEWS_VALIDATORS_FILE_PATH = 'news_validators.json'
+news_validators = {}
 
 # --- Functions ---
 
-def generate_simulated_content(region_name, category_name, count=ARTICLES_TO_FETCH_PER_RUN):
+def load_news_validators():
+    """
+    Loads the news API response validators saved by the previous run, if any. Entries without
+    merged articles (e.g. saved by older versions for every response) are dropped.
+    """
+    if not os.path.exists(NEWS_VALIDATORS_FILE_PATH):
+        return
+    try:
+        with open(NEWS_VALIDATORS_FILE_PATH, 'rb') as f:
+            saved_validators = json_loads(f.read())
+        if not isinstance(saved_validators, dict):
+            print(f"{NEWS_VALIDATORS_FILE_PATH} does not hold a JSON object. Sending unconditional requests.")
+            return
+        news_validators.update(
+            (validator_key, validators)
+            for validator_key, validators in saved_validators.items()
+            if isinstance(validators, dict) and validators.get('articleCount')
+        )
+        print(f"Loaded {len(news_validators)} news API response validators from {NEWS_VALIDATORS_FILE_PATH}")
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"Error reading {NEWS_VALIDATORS_FILE_PATH}: {e}. Sending unconditional requests.")
+        news_validators.clear()
+
+def save_news_validators():
+    """Persists the news API response validators for the next run."""
+    try:
+        write_file_atomically(NEWS_VALIDATORS_FILE_PATH, json_dumps(news_validators))
+    except IOError as e:
+        print(f"Error writing {NEWS_VALIDATORS_FILE_PATH}: {e}")
+
+async def get_news_json(news_client, category_key, url, params, headers=None):
+    """
+    GETs a news API endpoint as a conditional request, using the validators saved from the last
+    merged response to the same request for the same category. Returns (data, validator_update):
+    the body parsed with json_loads (orjson when installed), and the (key, validators) pair that
+    process_category records once the articles are merged, or None if the response had none.
+    Returns (None, None) if the API answered 304 Not Modified. Error statuses raise
+    httpx.HTTPStatusError, and a body that isn't JSON raises httpx.DecodingError.
+    """
+    validator_key = f"{category_key} {url}?{urlencode(sorted((k, v) for k, v in params.items() if k != 'api-key'))}"
+    validators = news_validators.get(validator_key, {})
+    request_headers = dict(headers or {})
+    if validators.get('etag'):
+        request_headers['If-None-Match'] = validators['etag']
+    if validators.get('lastModified'):
+        request_headers['If-Modified-Since'] = validators['lastModified']
+
+    response = await news_client.get(url, params=params, headers=request_headers)
+    if response.status_code == 304:
+        return None, None
+    response.raise_for_status()
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    validator_update = None
+    if etag or last_modified:
+        validator_update = (validator_key, {"etag": etag, "lastModified": last_modified})
+    try:
+        data = json_loads(response.content)
+    except ValueError as e: # json.JSONDecodeError, or UnicodeDecodeError from the stdlib fallback
+        # An HTML maintenance or proxy page served with 200 is handled like any other failed
+        # request, so the fetchers move on to the next attempt or source.
+        raise httpx.DecodingError(f"Response body is not valid JSON: {e}", request=response.request) from e
+    return data, validator_update
+
+def create_news_client():
     """
-    Generates simulated content as a last-resort fallback.
-    These articles will be explicitly marked as is_simulated=True.
+    Creates the httpx client shared by every NewsAPI.org and World News API request in a run.
+    Its connection pool keeps connections to each API alive, so the DNS lookup and TLS handshake
+    are paid once per host rather than once per request.
     """
-    articles = []
-    for i in range(count):
-        # Use more descriptive placeholder text for images
-        image_text = f"{category_name.replace('_', ' ').title()} {region_name.replace(' ', ' ').title()}"
-        
-        articles.append({
-            "title": f"Simulated {category_name.replace('_', ' ').title()} Headline for {region_name} - {random.randint(100, 999)}",
-            "content_raw": f"This is a simulated summary of {category_name.replace('_', ' ')} related to {region_name}, article number {i + 1}. It highlights key developments and insights. This content is for placeholder purposes only.",
-            "link": f"https://example.com/simulated/{region_name.lower().replace(' ', '-')}/{category_name.lower().replace(' ', '-')}/{i + 1}",
-            "imageUrl_raw": f"https://placehold.co/600x400/CCCCCC/333333?text=SIMULATED+{image_text.upper()}", 
-            "is_simulated": True # Explicitly mark as simulated
-        })
-    return articles
-
-async def fetch_from_newsapi_org(region_key, category_info, page_size):
-    """Attempts to fetch news from NewsAPI.org."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+        timeout=15
+    )
+
+async def fetch_from_newsapi_org(news_client, region_key, category_key, page_size):
+    """
+    Attempts to fetch news from NewsAPI.org. Returns (articles, validator_update) as described in
+    get_news_json, with None for articles if its results haven't changed since the last run.
+    """
+    category_info = CATEGORIES[category_key]
     country_codes_for_region = REGIONS[region_key]["country_codes"]
     newsapi_category = category_info["newsapi_cat"]
     newsapi_query_keyword = category_info["newsapi_query_keyword"]
@@ -126,12 +187,14 @@ async def fetch_from_newsapi_org(region_key, category_info, page_size):
             }
             headers = {'X-Api-Key': NEWSAPI_API_KEY}
             
-            print(f"DEBUG: NewsAPI.org Attempt for {region_key}/{category_info['newsapi_cat']} (Country: {country_code}, Category: '{current_cat_to_try}'): {params}")
+            logger.debug("NewsAPI.org Attempt for %s/%s (Country: %s, Category: '%s'): %s", region_key, category_info['newsapi_cat'], country_code, current_cat_to_try, params)
 
             try:
-                response = requests.get(f"{NEWSAPI_BASE_URL}top-headlines", params=params, headers=headers, timeout=15)
-                response.raise_for_status()
-                data = response.json()
+                await newsapi_rate_limiter.acquire()
+                data, validator_update = await get_news_json(news_client, category_key, f"{NEWSAPI_BASE_URL}top-headlines", params, headers)
+                if data is None:
+                    print(f"  -> NewsAPI.org results for {region_key}/{category_info['newsapi_cat']} not modified since the last run.")
+                    return None, None
                 
                 fetched_articles = []
                 for article_data in data.get('articles', []):
@@ -141,33 +204,29 @@ async def fetch_from_newsapi_org(region_key, category_info, page_size):
                     image_url = article_data.get('urlToImage')
 
                     if title and description and url:
-                        fetched_articles.append({
-                            "title": title,
-                            "content_raw": description,
-                            "link": url,
-                            "imageUrl_raw": image_url,
-                            "is_simulated": False
-                        })
+                        fetched_articles.append(RawArticle(
+                            title=title,
+                            content_raw=description,
+                            link=url,
+                            imageUrl_raw=image_url
+                        ))
                 if fetched_articles:
-                    print(f"DEBUG: Successfully fetched {len(fetched_articles)} articles from NewsAPI.org for {region_key}/{category_info['newsapi_cat']} (Country: {country_code}, Category: '{current_cat_to_try}').")
-                    return fetched_articles
+                    logger.debug("Successfully fetched %s articles from NewsAPI.org for %s/%s (Country: %s, Category: '%s').", len(fetched_articles), region_key, category_info['newsapi_cat'], country_code, current_cat_to_try)
+                    return fetched_articles, validator_update
                 else:
-                    print(f"DEBUG: NewsAPI.org returned no articles for {region_key}/{category_info['newsapi_cat']} (Country: {country_code}, Category: '{current_cat_to_try}').")
-                    time.sleep(1) # Small delay
+                    logger.debug("NewsAPI.org returned no articles for %s/%s (Country: %s, Category: '%s').", region_key, category_info['newsapi_cat'], country_code, current_cat_to_try)
                     continue
 
-            except requests.exceptions.HTTPError as http_err:
+            except httpx.HTTPStatusError as http_err:
                 error_response = {}
                 try:
-                    error_response = http_err.response.json()
+                    error_response = json_loads(http_err.response.content)
                 except json.JSONDecodeError:
                     pass
                 print(f"Error from NewsAPI.org for {region_key}/{category_info['newsapi_cat']} (Country: {country_code}, Category: '{current_cat_to_try}'): {http_err}. Response: {error_response}")
-                time.sleep(1) # Small delay
                 continue
-            except requests.exceptions.RequestException as e:
+            except httpx.HTTPError as e:
                 print(f"Network error from NewsAPI.org for {region_key}/{category_info['newsapi_cat']} (Country: {country_code}, Category: '{current_cat_to_try}'): {e}")
-                time.sleep(1) # Small delay
                 continue
     
     # For 'global' region, or if country-specific top-headlines failed, try the /everything endpoint with query
@@ -184,11 +243,13 @@ async def fetch_from_newsapi_org(region_key, category_info, page_size):
         }
         # If specific domains are needed for global, you'd add them here, e.g., 'domains': 'nytimes.com,bbc.com'
         headers = {'X-Api-Key': NEWSAPI_API_KEY}
-        print(f"DEBUG: NewsAPI.org Attempt for global/{category_info['newsapi_cat']} (Query: '{newsapi_query_keyword}'): {params}")
+        logger.debug("NewsAPI.org Attempt for global/%s (Query: '%s'): %s", category_info['newsapi_cat'], newsapi_query_keyword, params)
         try:
-            response = requests.get(f"{NEWSAPI_BASE_URL}everything", params=params, headers=headers, timeout=15)
-            response.raise_for_status()
-            data = response.json()
+            await newsapi_rate_limiter.acquire()
+            data, validator_update = await get_news_json(news_client, category_key, f"{NEWSAPI_BASE_URL}everything", params, headers)
+            if data is None:
+                print(f"  -> NewsAPI.org (everything) results for {region_key}/{category_info['newsapi_cat']} not modified since the last run.")
+                return None, None
             fetched_articles = []
             for article_data in data.get('articles', []):
                 title = article_data.get('title')
@@ -196,25 +257,28 @@ async def fetch_from_newsapi_org(region_key, category_info, page_size):
                 url = article_data.get('url')
                 image_url = article_data.get('urlToImage')
                 if title and description and url:
-                    fetched_articles.append({
-                        "title": title,
-                        "content_raw": description,
-                        "link": url,
-                        "imageUrl_raw": image_url,
-                        "is_simulated": False
-                    })
+                    fetched_articles.append(RawArticle(
+                        title=title,
+                        content_raw=description,
+                        link=url,
+                        imageUrl_raw=image_url
+                    ))
             if fetched_articles:
-                print(f"DEBUG: Successfully fetched {len(fetched_articles)} articles from NewsAPI.org (everything) for global/{category_info['newsapi_cat']}.")
-                return fetched_articles
+                logger.debug("Successfully fetched %s articles from NewsAPI.org (everything) for global/%s.", len(fetched_articles), category_info['newsapi_cat'])
+                return fetched_articles, validator_update
             else:
-                print(f"DEBUG: NewsAPI.org (everything) returned no articles for global/{category_info['newsapi_cat']}.")
-        except requests.exceptions.RequestException as e:
+                logger.debug("NewsAPI.org (everything) returned no articles for global/%s.", category_info['newsapi_cat'])
+        except httpx.HTTPError as e:
             print(f"Error from NewsAPI.org (everything) for global/{category_info['newsapi_cat']}: {e}")
     
-    return [] # Return empty if no articles found from NewsAPI.org
+    return [], None # Return empty if no articles found from NewsAPI.org
 
-async def fetch_from_worldnewsapi(region_key, category_info, page_size):
-    """Attempts to fetch news from World News API."""
+async def fetch_from_worldnewsapi(news_client, region_key, category_key, page_size):
+    """
+    Attempts to fetch news from World News API. Returns (articles, validator_update) as described
+    in get_news_json, with None for articles if its results haven't changed since the last run.
+    """
+    category_info = CATEGORIES[category_key]
     country_codes_for_region = REGIONS[region_key]["country_codes"]
     query_keyword = category_info["worldnewsapi_query"]
 
@@ -229,11 +293,13 @@ async def fetch_from_worldnewsapi(region_key, category_info, page_size):
             'number': page_size, # World News API uses 'number' for page size
             'source-countries': country_code
         }
-        print(f"DEBUG: World News API Attempt for {region_key}/{category_info['worldnewsapi_query']} (Country: {country_code}, Query: '{query_keyword}'): {params}")
+        logger.debug("World News API Attempt for %s/%s (Country: %s, Query: '%s'): %s", region_key, category_info['worldnewsapi_query'], country_code, query_keyword, params)
         try:
-            response = requests.get(f"{WORLD_NEWS_API_BASE_URL}search-news", params=params, timeout=15)
-            response.raise_for_status()
-            data = response.json()
+            await worldnewsapi_rate_limiter.acquire()
+            data, validator_update = await get_news_json(news_client, category_key, f"{WORLD_NEWS_API_BASE_URL}search-news", params)
+            if data is None:
+                print(f"  -> World News API results for {region_key}/{category_info['worldnewsapi_query']} not modified since the last run.")
+                return None, None
             
             fetched_articles = []
             for article_data in data.get('news', []): # World News API uses 'news' key
@@ -243,33 +309,29 @@ async def fetch_from_worldnewsapi(region_key, category_info, page_size):
                 image_url = article_data.get('image') # World News API uses 'image' for image URL
 
                 if title and content_text and url:
-                    fetched_articles.append({
-                        "title": title,
-                        "content_raw": content_text,
-                        "link": url,
-                        "imageUrl_raw": image_url,
-                        "is_simulated": False
-                    })
+                    fetched_articles.append(RawArticle(
+                        title=title,
+                        content_raw=content_text,
+                        link=url,
+                        imageUrl_raw=image_url
+                    ))
             if fetched_articles:
-                print(f"DEBUG: Successfully fetched {len(fetched_articles)} articles from World News API for {region_key}/{category_info['worldnewsapi_query']} (Country: {country_code}).")
-                return fetched_articles
+                logger.debug("Successfully fetched %s articles from World News API for %s/%s (Country: %s).", len(fetched_articles), region_key, category_info['worldnewsapi_query'], country_code)
+                return fetched_articles, validator_update
             else:
-                print(f"DEBUG: World News API returned no articles for {region_key}/{category_info['worldnewsapi_query']} (Country: {country_code}).")
-                time.sleep(1) # Small delay
+                logger.debug("World News API returned no articles for %s/%s (Country: %s).", region_key, category_info['worldnewsapi_query'], country_code)
                 continue
 
-        except requests.exceptions.HTTPError as http_err:
+        except httpx.HTTPStatusError as http_err:
             error_response = {}
             try:
-                error_response = http_err.response.json()
+                error_response = json_loads(http_err.response.content)
             except json.JSONDecodeError:
                 pass
             print(f"Error from World News API for {region_key}/{category_info['worldnewsapi_query']} (Country: {country_code}): {http_err}. Response: {error_response}")
-            time.sleep(1) # Small delay
             continue
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             print(f"Network error from World News API for {region_key}/{category_info['worldnewsapi_query']} (Country: {country_code}): {e}")
-            time.sleep(1) # Small delay
             continue
     
     # For 'global' region, try a broader search without country filter
@@ -280,11 +342,13 @@ async def fetch_from_worldnewsapi(region_key, category_info, page_size):
             'language': 'en',
             'number': page_size
         }
-        print(f"DEBUG: World News API Attempt for global/{category_info['worldnewsapi_query']} (Query: '{query_keyword}'): {params}")
+        logger.debug("World News API Attempt for global/%s (Query: '%s'): %s", category_info['worldnewsapi_query'], query_keyword, params)
         try:
-            response = requests.get(f"{WORLD_NEWS_API_BASE_URL}search-news", params=params, timeout=15)
-            response.raise_for_status()
-            data = response.json()
+            await worldnewsapi_rate_limiter.acquire()
+            data, validator_update = await get_news_json(news_client, category_key, f"{WORLD_NEWS_API_BASE_URL}search-news", params)
+            if data is None:
+                print(f"  -> World News API (global search) results for {region_key}/{category_info['worldnewsapi_query']} not modified since the last run.")
+                return None, None
             fetched_articles = []
             for article_data in data.get('news', []):
                 title = article_data.get('title')
@@ -292,120 +356,213 @@ async def fetch_from_worldnewsapi(region_key, category_info, page_size):
                 url = article_data.get('url')
                 image_url = article_data.get('image')
                 if title and content_text and url:
-                    fetched_articles.append({
-                        "title": title,
-                        "content_raw": content_text,
-                        "link": url,
-                        "imageUrl_raw": image_url,
-                        "is_simulated": False
-                    })
+                    fetched_articles.append(RawArticle(
+                        title=title,
+                        content_raw=content_text,
+                        link=url,
+                        imageUrl_raw=image_url
+                    ))
             if fetched_articles:
-                print(f"DEBUG: Successfully fetched {len(fetched_articles)} articles from World News API (global search) for global/{category_info['worldnewsapi_query']}.")
-                return fetched_articles
+                logger.debug("Successfully fetched %s articles from World News API (global search) for global/%s.", len(fetched_articles), category_info['worldnewsapi_query'])
+                return fetched_articles, validator_update
             else:
-                print(f"DEBUG: World News API (global search) returned no articles for global/{category_info['worldnewsapi_query']}.")
-        except requests.exceptions.RequestException as e:
+                logger.debug("World News API (global search) returned no articles for global/%s.", category_info['worldnewsapi_query'])
+        except httpx.HTTPError as e:
             print(f"Error from World News API (global search) for global/{category_info['worldnewsapi_query']}: {e}")
 
-    return [] # Return empty if no articles found from World News API
+    return [], None # Return empty if no articles found from World News API
 
-async def get_mistral_summary_and_image(original_title, original_content_raw, category_name, original_image_url_raw):
-    """
-    Uses Mistral AI API to summarize content and suggest a relevant image URL.
-    This function now processes real data from NewsAPI.org or World News API.
+# News sources in fallback order: (name, API key, API key variable, fetch function).
+# A source whose API key is not configured is skipped.
+NEWS_SOURCES = (
+    ("NewsAPI.org", NEWSAPI_API_KEY, "NEWSAPI_API_KEY", fetch_from_newsapi_org),
+    ("World News API", WORLD_NEWS_API_KEY, "WORLD_NEWS_API_KEY", fetch_from_worldnewsapi),
+)
+
+async def save_progress(output_file_path, all_content):
     """
-    prompt = f"""
-    You are an AI assistant for a news portal. Your task is to take the following article
-    title and content, and generate a concise summary (around 50-70 words) for a news feed.
-    The summary should capture the main points and be engaging.
-    Additionally, suggest a relevant direct image URL. If an image URL is provided, validate it. If it's missing or invalid, suggest a new one.
-    Prioritize real image URLs if available and valid. If generating, use 'https://picsum.photos/600/400/?random' or 'https://placehold.co/600x400/HEX/HEX?text=TEXT'.
-
-    Original Title: "{original_title}"
-    Original Content: "{original_content_raw}"
-    Category: "{category_name}"
-    Original Image URL (if available): "{original_image_url_raw}"
-
-    Provide the output in JSON format with the following schema:
-    {{
-      "summary": "string",
-      "suggestedImageUrl": "string"
-    }}
+    Persists updates.json and the Mistral AI cache. Called after every category that changed,
+    so the work done so far survives if the run is interrupted. Returns True on success.
     """
+    # Serialize on the event loop thread, where no other task can modify the Mistral AI cache or
+    # all_content meanwhile, then write in worker threads so the event loop isn't blocked (and
+    # other categories' Mistral AI streams aren't stalled) while the files are written and synced.
+    mistral_cache_data, mistral_cache_entries = serialize_mistral_cache()
+    await asyncio.to_thread(write_mistral_cache, mistral_cache_data, mistral_cache_entries)
+    try:
+        data = json_dumps(all_content, indent=True)
+        await asyncio.to_thread(write_file_atomically, output_file_path, data)
+        return True
+    except IOError as e:
+        print(f"Error writing to file {output_file_path}: {e}")
+        return False
 
-    payload = {
-        "model": "mistral-tiny",
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "response_format": {"type": "json_object"}
-    }
+def prune_stale_regions(all_content):
+    """
+    Drops top-level entries of updates.json that are not one of the current REGIONS, such as the
+    continent-based regions used before the switch to countries. index.html never shows them, yet
+    they made up most of the file that every run loads and rewrites and every visitor downloads.
+    Region entries that are not a category dict are reset. Returns True if anything was changed.
+    """
+    changed = False
+    for key in list(all_content):
+        if key in ('last_updated_utc', 'last_completed_batch_utc'):
+            continue
+        if key not in REGIONS:
+            del all_content[key]
+            changed = True
+        elif not isinstance(all_content[key], dict):
+            all_content[key] = {}
+            changed = True
+    return changed
+
+def is_category_fresh(existing_articles):
+    """
+    True if a category is already full of real articles and its newest one was fetched
+    within CATEGORY_FRESHNESS_HOURS. Articles saved before "fetched_at" existed never count as fresh.
+    """
+    if len(existing_articles) < MAX_ARTICLES_PER_CATEGORY:
+        return False
+    if any(article.get('is_simulated') for article in existing_articles[:5]):
+        return False
+    try:
+        fetched_at = datetime.fromisoformat(existing_articles[0]['fetched_at'])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return datetime.now(timezone.utc) - fetched_at < timedelta(hours=CATEGORY_FRESHNESS_HOURS)
 
+def is_current_batch_completed(all_content):
+    """
+    True if a run already completed the current batch, e.g. when the workflow is re-triggered by a
+    push or by hand within the same 4-hour window. This is read from updates.json itself rather
+    than from the file's mtime, which a fresh checkout resets.
+    """
     try:
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'Authorization': f'Bearer {MISTRAL_API_KEY}'
-        }
-        
-        response = requests.post(MISTRAL_API_BASE_URL, headers=headers, data=json.dumps(payload), timeout=30)
-        response.raise_for_status()
-        result = response.json()
-        
-        print(f"DEBUG: Raw Mistral AI response for '{original_title}': {json.dumps(result, indent=2)}")
-
-        if result.get('choices') and result['choices'][0].get('message') and result['choices'][0]['message'].get('content'):
-            json_string = result['choices'][0]['message']['content']
-            parsed_json = json.loads(json_string)
-            
-            summary = parsed_json.get('summary', original_content_raw)
-            suggested_image_url = parsed_json.get('suggestedImageUrl', '')
+        last_completed = datetime.fromisoformat(all_content['last_completed_batch_utc'])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return last_completed >= get_current_batch_start()
+
+async def process_category(region_key, category_key, all_content, news_client, mistral_client, output_file_path, save_lock):
+    """
+    Fetches, summarizes and merges the articles of one (region, category) pair into all_content.
+    Categories are independent, so main() runs a whole batch of these concurrently.
+    Returns True if the category was updated.
+    """
+    region_name_full = REGIONS[region_key]["name"]
+
+    print(f"Processing Region: {region_name_full}, Category: {category_key} with NewsAPI.org, World News API, and Mistral AI...")
+
+    if is_category_fresh(all_content[region_key].get(category_key, [])):
+        print(f"  -> {region_key}/{category_key} is full and was updated within {CATEGORY_FRESHNESS_HOURS}h. Skipping.")
+        return False
+
+    articles_to_add = []
+    validator_update = None
 
-            if original_image_url_raw and (original_image_url_raw.startswith('http://') or original_image_url_raw.startswith('https://')):
-                final_image_url = original_image_url_raw
-            elif suggested_image_url and (suggested_image_url.startswith('http://') or suggested_image_url.startswith('https://')):
-                final_image_url = suggested_image_url
+    # Try each news source in fallback order until one returns articles
+    for source_name, api_key, api_key_name, fetch_articles in NEWS_SOURCES:
+        if not api_key:
+            print(f"  -> {api_key_name} not configured. Skipping {source_name} for {region_key}/{category_key}.")
+            continue
+        articles_to_add, validator_update = await fetch_articles(news_client, region_key, category_key, ARTICLES_TO_FETCH_PER_RUN)
+        if articles_to_add is None: # Same results as last run, which are already merged
+            articles_to_add = []
+            break
+        if articles_to_add:
+            print(f"  -> Fetched {len(articles_to_add)} articles from {source_name} for {region_key}/{category_key}.")
+            break
+        print(f"  -> {source_name} returned no articles for {region_key}/{category_key}.")
+    
+    current_processed_articles_batch = [] 
+    new_real_articles_count = 0 # Counted while assembling the batch, so no second pass is needed
+
+    if articles_to_add: # Only process with Mistral if we got articles from either API
+        # Serve already-summarized articles from the cache and send the rest to Mistral AI in batches
+        # of up to MISTRAL_MAX_ARTICLES_PER_REQUEST articles.
+        mistral_results = [None] * len(articles_to_add)
+        uncached_indices = []
+        for i, article_raw in enumerate(articles_to_add):
+            cached_result = get_cached_mistral_result(article_raw.title, article_raw.content_raw, category_key)
+            if cached_result:
+                mistral_results[i] = (cached_result['summary'], cached_result['imageUrl'], False)
             else:
-                image_keywords_for_fallback = category_name.replace('_', '+') + "+" + original_title.replace(' ', '+')
-                final_image_url = f"https://placehold.co/600x400/CCCCCC/333333?text=AI+Image+Fallback"
+                uncached_indices.append(i)
+        print(f"  - {len(articles_to_add) - len(uncached_indices)}/{len(articles_to_add)} articles for {region_key}/{category_key} found in Mistral AI cache.")
 
-            return summary, final_image_url, False # Mistral successfully processed
-        else:
-            print(f"Mistral AI API response missing expected structure for '{original_title}': {result}")
-            return original_content_raw, original_image_url_raw or 'https://placehold.co/600x400/CCCCCC/333333?text=AI+Process+Failed', True 
-
-    except requests.exceptions.RequestException as e:
-        print(f"Error calling Mistral AI API for '{original_title}': {e}")
-        if response and response.text:
-            print(f"Mistral AI API Error Response: {response.text}")
-        return original_content_raw, original_image_url_raw or 'https://placehold.co/600x400/CCCCCC/333333?text=API+Error+Image', True 
-    except json.JSONDecodeError as e:
-        print(f"Error decoding Mistral AI API JSON response for '{original_title}': {e}")
-        if response and response.text:
-            print(f"Raw Mistral AI response text: {response.text}")
-        return original_content_raw, original_image_url_raw or 'https://placehold.co/600x400/CCCCCC/333333?text=JSON+Error+Image', True 
-
-
-def get_current_batch_index():
+        if uncached_indices:
+            index_chunks = [
+                uncached_indices[start:start + MISTRAL_MAX_ARTICLES_PER_REQUEST]
+                for start in range(0, len(uncached_indices), MISTRAL_MAX_ARTICLES_PER_REQUEST)
+            ]
+            print(f"  - Processing {len(uncached_indices)} articles for {region_key}/{category_key} with Mistral AI in {len(index_chunks)} request(s)...")
+            chunk_results = await asyncio.gather(*(
+                get_mistral_summaries_and_images(mistral_client, [articles_to_add[i] for i in index_chunk], category_key)
+                for index_chunk in index_chunks
+            ))
+            for index_chunk, batch_results in zip(index_chunks, chunk_results):
+                for i, batch_result in zip(index_chunk, batch_results):
+                    mistral_results[i] = batch_result
+
+        fetched_at = datetime.now(timezone.utc).isoformat()
+        for article_raw, (summary_content, final_image_url, mistral_processing_failed) in zip(articles_to_add, mistral_results):
+            is_simulated = mistral_processing_failed # Marks the article as not summarized by Mistral AI
+            if not is_simulated:
+                new_real_articles_count += 1
+            current_processed_articles_batch.append({
+                "title": article_raw.title, 
+                "content": summary_content, 
+                "link": article_raw.link, 
+                "imageUrl": final_image_url, 
+                "is_simulated": is_simulated,
+                "fetched_at": fetched_at
+            })
+    else:
+        # Simulated content is never published to updates.json, so none is generated here;
+        # the category keeps its existing articles.
+        print(f"  -> No real articles found for {region_key}/{category_key}. Keeping its existing articles.")
+
+    # --- Incremental Merging Logic ---
+    # ONLY update the category if we have new, successfully processed (non-simulated) articles from APIs.
+    # A batch where every Mistral call failed would otherwise push real articles out of the category.
+    if new_real_articles_count: # If this batch contains real articles processed by Mistral
+        existing_articles_for_category = all_content[region_key].get(category_key, [])
+    
+        # Filter out old articles that were marked as simulated (e.g., if Mistral failed on them previously, or if they were old simulated content).
+        filtered_existing_articles = [
+            art for art in existing_articles_for_category if not art.get('is_simulated', False) 
+        ]
+    
+        # The bounded deque drops the oldest articles from the right as new ones are pushed on the left.
+        # It is turned back into a list right away because JSON encoders only serialize lists.
+        combined_articles = deque(filtered_existing_articles, maxlen=MAX_ARTICLES_PER_CATEGORY)
+        combined_articles.extendleft(reversed(current_processed_articles_batch))
+    
+        all_content[region_key][category_key] = list(combined_articles)
+        print(f"  -> Added {new_real_articles_count} new real articles. Total articles for {region_key}/{category_key}: {len(all_content[region_key][category_key])}")
+        all_content['last_updated_utc'] = datetime.now(timezone.utc).isoformat()
+        if validator_update and new_real_articles_count == len(articles_to_add):
+            # Only now is a 304 for this request safe: every article of the response is merged.
+            validator_key, validators = validator_update
+            news_validators[validator_key] = {**validators, "articleCount": len(articles_to_add)}
+        async with save_lock: # One checkpoint write at a time
+            await save_progress(output_file_path, all_content) # Checkpoint after each updated category
+        return True
+    else:
+        print(f"  -> {region_key}/{category_key} content remains unchanged (no new real articles successfully processed).")
+        return False
+
+async def process_category_safely(region_key, category_key, *args):
     """
-    Determines which batch of categories to process based on the current UTC hour.
-    Assumes workflow runs at 00:00, 04:00, 08:00, 12:00, 16:00, 20:00 UTC.
+    Runs process_category and logs its errors instead of raising them, so one failing category
+    doesn't cancel the rest of the batch running alongside it in the same task group.
+    Returns True if the category was updated.
     """
-    now_utc = datetime.now(timezone.utc)
-    current_hour_utc = now_utc.hour
-
-    if 0 <= current_hour_utc < 4:
-        return 0 
-    elif 4 <= current_hour_utc < 8:
-        return 1 
-    elif 8 <= current_hour_utc < 12:
-        return 2 
-    elif 12 <= current_hour_utc < 16:
-        return 3 
-    elif 16 <= current_hour_utc < 20:
-        return 4 
-    else: # 20 <= current_hour_utc < 24
-        return 5 
+    try:
+        return await process_category(region_key, category_key, *args)
+    except Exception as e:
+        print(f"Error processing {region_key}/{category_key}: {type(e).__name__}: {e}")
+        return False
 
 async def main():
     output_file_path = 'updates.json'
@@ -413,8 +570,7 @@ async def main():
     
     if os.path.exists(output_file_path):
         try:
-            with open(output_file_path, 'r', encoding='utf-8') as f:
-                all_content = json.load(f)
+            all_content = await asyncio.to_thread(read_json_file, output_file_path)
             print(f"Successfully loaded existing content from {output_file_path}")
         except json.JSONDecodeError as e:
             print(f"Error decoding existing {output_file_path}: {e}. Starting with empty content.")
@@ -425,107 +581,56 @@ async def main():
     else:
         print(f"No existing {output_file_path} found. Starting with empty content.")
 
-    all_content['last_updated_utc'] = datetime.now(timezone.utc).isoformat()
+    if is_current_batch_completed(all_content) and not FORCE_RUN:
+        print(f"Batch {get_current_batch_index() + 1}/{NUM_BATCHES} was already processed at {all_content['last_completed_batch_utc']}. Nothing to do (set FORCE_RUN=true to run it again).")
+        return
+
+    content_changed = prune_stale_regions(all_content)
+    for region_key in REGIONS: # Every region has a category dict from here on
+        all_content.setdefault(region_key, {})
+
+    load_mistral_cache()
+    load_news_validators()
 
     current_batch_idx = get_current_batch_index()
-    start_idx = current_batch_idx * BATCH_SIZE
-    end_idx = min(start_idx + BATCH_SIZE, TOTAL_CATEGORIES)
-    categories_to_process_in_this_run = ALL_CATEGORY_KEYS[start_idx:end_idx]
+    categories_to_process_in_this_run = BATCHES[current_batch_idx]
 
     print(f"--- Processing Batch {current_batch_idx + 1}/{NUM_BATCHES} ({len(categories_to_process_in_this_run)} categories) ---")
 
-    for region_key, category_key in categories_to_process_in_this_run:
-        region_name_full = REGIONS[region_key]["name"]
-        category_info = CATEGORIES[category_key]
-        
-        print(f"Processing Region: {region_name_full}, Category: {category_key} with NewsAPI.org, World News API, and Mistral AI...")
-        
-        if region_key not in all_content:
-            all_content[region_key] = {}
-        
-        articles_to_add = []
-
-        # 1. Attempt to fetch from NewsAPI.org
-        if NEWSAPI_API_KEY:
-            newsapi_articles = await fetch_from_newsapi_org(region_key, category_info, ARTICLES_TO_FETCH_PER_RUN)
-            if newsapi_articles:
-                articles_to_add = newsapi_articles
-                print(f"  -> Fetched {len(newsapi_articles)} articles from NewsAPI.org for {region_key}/{category_key}.")
-            else:
-                print(f"  -> NewsAPI.org returned no articles for {region_key}/{category_key}. Trying World News API.")
+    save_lock = asyncio.Lock()
+    # One pooled, keep-alive client is shared by every news API request in this run, and one
+    # HTTP/2 client by every Mistral AI request.
+    async with create_news_client() as news_client, create_mistral_client() as mistral_client:
+        # Categories are processed concurrently; the news API and Mistral AI rate limiters keep the
+        # request rates within budget, so no fixed sleeps between categories are needed.
+        category_args = [
+            (region_key, category_key, all_content, news_client, mistral_client, output_file_path, save_lock)
+            for region_key, category_key in categories_to_process_in_this_run
+        ]
+        if hasattr(asyncio, 'TaskGroup'): # Python 3.11+
+            async with asyncio.TaskGroup() as task_group:
+                tasks = [task_group.create_task(process_category_safely(*args)) for args in category_args]
+            category_updates = [task.result() for task in tasks]
         else:
-            print(f"  -> NEWSAPI_API_KEY not configured. Skipping NewsAPI.org for {region_key}/{category_key}.")
-
-        # 2. If NewsAPI.org failed, attempt to fetch from World News API
-        if not articles_to_add and WORLD_NEWS_API_KEY:
-            worldnewsapi_articles = await fetch_from_worldnewsapi(region_key, category_info, ARTICLES_TO_FETCH_PER_RUN)
-            if worldnewsapi_articles:
-                articles_to_add = worldnewsapi_articles
-                print(f"  -> Fetched {len(worldnewsapi_articles)} articles from World News API for {region_key}/{category_key}.")
-            else:
-                print(f"  -> World News API returned no articles for {region_key}/{category_key}. Falling back to simulated content (not published).")
-        elif not articles_to_add and not WORLD_NEWS_API_KEY:
-            print(f"  -> WORLD_NEWS_API_KEY not configured. Skipping World News API for {region_key}/{category_key}.")
-            
-        current_processed_articles_batch = [] 
-
-        if articles_to_add: # Only process with Mistral if we got articles from either API
-            for i, article_raw in enumerate(articles_to_add):
-                print(f"  - Processing article {i+1}/{len(articles_to_add)} for {region_key}/{category_key} with Mistral AI...")
-                
-                summary_content, final_image_url, mistral_processing_failed = await get_mistral_summary_and_image(
-                    article_raw['title'], 
-                    article_raw['content_raw'], 
-                    category_key,
-                    article_raw['imageUrl_raw']
-                )
-                
-                current_processed_articles_batch.append({
-                    "title": article_raw['title'], 
-                    "content": summary_content, 
-                    "link": article_raw['link'], 
-                    "imageUrl": final_image_url, 
-                    "is_simulated": article_raw['is_simulated'] or mistral_processing_failed # True if original was simulated OR Mistral failed
-                })
-                time.sleep(20) # Delay after each Mistral AI call
-        else:
-            # If no articles from either API, generate simulated content, but mark it as such
-            # This content will NOT be published to updates.json if it's purely simulated.
-            simulated_fallback_articles = generate_simulated_content(
-                region_name_full, category_key, count=ARTICLES_TO_FETCH_PER_RUN
-            )
-            print(f"  -> No real articles found for {region_key}/{category_key}. Generated simulated fallback content (will be filtered by frontend).")
-            # We don't add simulated_fallback_articles to current_processed_articles_batch
-            # because we are explicitly NOT publishing simulated content to updates.json.
-
-        # --- Incremental Merging Logic ---
-        # ONLY update the category if we have new, successfully processed (non-simulated) articles from APIs.
-        if current_processed_articles_batch: # If this batch contains real articles processed by Mistral
-            if category_key not in all_content[region_key]:
-                all_content[region_key][category_key] = []
-                
-            existing_articles_for_category = all_content[region_key].get(category_key, [])
-            
-            # Filter out old articles that were marked as simulated (e.g., if Mistral failed on them previously, or if they were old simulated content).
-            filtered_existing_articles = [
-                art for art in existing_articles_for_category if not art.get('is_simulated', False) 
-            ]
-            
-            combined_articles = current_processed_articles_batch + filtered_existing_articles
-            
-            all_content[region_key][category_key] = combined_articles[:MAX_ARTICLES_PER_CATEGORY]
-            print(f"  -> Total articles for {region_key}/{category_key}: {len(all_content[region_key][category_key])}")
-        else:
-            print(f"  -> {region_key}/{category_key} content remains unchanged (no new real articles successfully processed).")
-        
-        time.sleep(45) # Delay between categories/regions
-
-    try:
-        with open(output_file_path, 'w', encoding='utf-8') as f:
-            json.dump(all_content, f, indent=2, ensure_ascii=False)
+            category_updates = await asyncio.gather(*(process_category_safely(*args) for args in category_args))
+
+    # A batch that updated nothing leaves updates.json byte-for-byte unchanged, so the workflow
+    # has nothing to commit and the published file (and visitors' cached copies) stay valid.
+    save_news_validators()
+    if not content_changed and not any(category_updates):
+        save_mistral_cache()
+        print(f"No category was updated in this batch. Leaving {output_file_path} unchanged.")
+        return
+
+    all_content['last_completed_batch_utc'] = datetime.now(timezone.utc).isoformat()
+    if await save_progress(output_file_path, all_content):
         print(f"Successfully generated and saved content to {output_file_path}")
-    except IOError as e:
-        print(f"Error writing to file {output_file_path}: {e}")
 
 if __name__ == "__main__":
+    # LOG_LEVEL applies to this script's loggers only: httpx and its HTTP/2 stack would log every
+    # request's headers, including the API keys, at DEBUG level.
+    log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+    logging.basicConfig(format='%(levelname)s: %(message)s')
+    logger.setLevel(log_level)
+    logging.getLogger('mistral_core').setLevel(log_level)
     asyncio.run(main())
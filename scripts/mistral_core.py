@@ -0,0 +1,404 @@
+"""
+Mistral AI client used by generate_content.py: batched article summarization over
+streamed (SSE) responses, retries with exponential backoff, and the on-disk response cache.
+"""
+import asyncio
+import hashlib
+import httpx
+import json
+import logging
+import os
+import random
+import time
+
+from content_common import (
+    AsyncRateLimiter,
+    get_positive_int_env,
+    json_dumps,
+    json_loads,
+    write_file_atomically
+)
+
+logger = logging.getLogger(__name__)
+
+# Mistral AI API key should be stored as a GitHub Secret named MISTRAL_API_KEY.
+MISTRAL_API_BASE_URL = "https://api.mistral.ai"
+MISTRAL_CHAT_COMPLETIONS_PATH = "/v1/chat/completions"
+MISTRAL_API_KEY = os.getenv('MISTRAL_API_KEY') 
+
+# --- Debugging Print for API Key ---
+if MISTRAL_API_KEY:
+    MISTRAL_API_KEY = MISTRAL_API_KEY.strip()
+    print(f"MISTRAL_API_KEY successfully loaded from environment. Length: {len(MISTRAL_API_KEY)}. Starts with: {MISTRAL_API_KEY[:5]}... Ends with: {MISTRAL_API_KEY[-5:]}")
+else:
+    print("WARNING: MISTRAL_API_KEY is NOT loaded from environment. Please check GitHub Secrets and workflow env configuration.")
+# --- End Debugging Print ---
+
+# --- Mistral AI request skeleton ---
+# Built once at import; each request only adds its own "messages".
+# Responses are streamed as server-sent events, so a reply that isn't the requested JSON
+# object is abandoned after its first tokens instead of after the whole generation.
+MISTRAL_HEADERS = {
+    'Content-Type': 'application/json',
+    'Accept': 'text/event-stream',
+    'Authorization': f'Bearer {MISTRAL_API_KEY}'
+}
+MISTRAL_BASE_PAYLOAD = {
+    "model": "mistral-tiny",
+    "response_format": {"type": "json_object"},
+    "stream": True
+}
+
+# --- Mistral AI response cache ---
+# The prompt is fully determined by (title, content, category), so summaries are cached
+# on disk under a hash of those inputs. Articles that were already summarized on a
+# previous run (top headlines often persist for days) skip the Mistral API call entirely.
+# The workflow persists this file between runs with actions/cache.
+# Entries are kept in least-recently-used order (dicts and the JSON file both preserve insertion
+# order), and the oldest ones are evicted beyond MISTRAL_CACHE_MAX_ENTRIES.
+# Each entry records when it was cached ("cachedAt", Unix seconds); entries older than
+# MISTRAL_CACHE_TTL_DAYS are dropped on load, so a stale summary isn't served indefinitely.
+MISTRAL_CACHE_FILE_PATH = 'mistral_cache.json'
+MISTRAL_CACHE_MAX_ENTRIES = 5000
+MISTRAL_CACHE_TTL_DAYS = 7
+mistral_cache = {}
+
+# --- Mistral AI prompt ---
+# The instructions are identical for every request, so they are sent as a constant system message
+# built once at import, and the user message carries only the per-batch article data. A stable
+# prefix also lets the API reuse its prompt cache across requests.
+MISTRAL_SYSTEM_PROMPT = """You are an AI assistant for a news portal. Your task is to take each of the articles in the user's message
+(title and content), and generate a concise summary (around 50-70 words) for a news feed.
+Each summary should capture the main points of its article and be engaging.
+Additionally, suggest a relevant direct image URL for each article. If an image URL is provided, validate it. If it's missing or invalid, suggest a new one.
+Prioritize real image URLs if available and valid. If generating, use 'https://picsum.photos/600/400/?random' or 'https://placehold.co/600x400/HEX/HEX?text=TEXT'.
+
+Provide the output in JSON format with the following schema, with exactly one entry per article
+in the same order as the articles:
+{
+  "results": [
+    {
+      "id": "number",
+      "summary": "string",
+      "suggestedImageUrl": "string"
+    }
+  ]
+}
+"""
+MISTRAL_SYSTEM_MESSAGE = {"role": "system", "content": MISTRAL_SYSTEM_PROMPT}
+MISTRAL_USER_PROMPT_TEMPLATE = 'Category: "{category}"\nArticles: {articles}'
+# Articles summarized per request. A category's articles share requests to amortize the round
+# trip, but smaller batches keep the reply well inside the model's output-length limit.
+MISTRAL_MAX_ARTICLES_PER_REQUEST = 5
+
+# --- Mistral AI retry policy ---
+MISTRAL_MAX_ATTEMPTS = 5
+MISTRAL_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+MISTRAL_MAX_RETRY_DELAY_SECONDS = 30 # Cap on the exponential backoff, before jitter
+
+# --- Mistral AI rate limit ---
+# Mistral AI's free tier allows one request per second (60 per minute). The budget is set per
+# minute so lower tiers (e.g. 30) can be expressed too; requests are spaced evenly across it.
+# Workspaces on a higher tier can raise the MISTRAL_MAX_REQUESTS_PER_MINUTE and
+# MISTRAL_MAX_CONCURRENT_REQUESTS variables.
+MISTRAL_MAX_REQUESTS_PER_MINUTE = get_positive_int_env('MISTRAL_MAX_REQUESTS_PER_MINUTE', 60)
+MISTRAL_MAX_CONCURRENT_REQUESTS = get_positive_int_env('MISTRAL_MAX_CONCURRENT_REQUESTS', 5) # Upper bound on requests in flight at once
+# The API also caps tokens per minute. Each request's size is estimated up front from its prompt
+# (about four characters per token) plus an allowance for each article's summary in the reply,
+# so large batches are spaced out before the API has to reject them with 429.
+MISTRAL_MAX_TOKENS_PER_MINUTE = get_positive_int_env('MISTRAL_MAX_TOKENS_PER_MINUTE', 500000)
+MISTRAL_CHARS_PER_TOKEN = 4
+MISTRAL_REPLY_TOKENS_PER_ARTICLE = 150 # A 50-70 word summary and an image URL, wrapped in JSON
+
+# --- Functions ---
+
+class MistralOutputError(ValueError):
+    """Raised when a streamed Mistral AI reply can't be the requested JSON object."""
+
+# One request per 60 / MISTRAL_MAX_REQUESTS_PER_MINUTE seconds, without bursts.
+mistral_rate_limiter = AsyncRateLimiter(1, 60 / MISTRAL_MAX_REQUESTS_PER_MINUTE)
+mistral_token_limiter = AsyncRateLimiter(MISTRAL_MAX_TOKENS_PER_MINUTE, 60)
+mistral_semaphore = asyncio.Semaphore(MISTRAL_MAX_CONCURRENT_REQUESTS)
+
+def get_mistral_cache_key(original_title, original_content_raw, category_name):
+    """Returns the cache key for a Mistral AI summarization request."""
+    return hashlib.sha256(f"{original_title}|{original_content_raw}|{category_name}".encode('utf-8')).hexdigest()
+
+def get_cached_mistral_result(original_title, original_content_raw, category_name):
+    """
+    Returns the cached {"summary", "imageUrl"} result for an article, or None.
+    A hit moves the entry to the most-recently-used end of the cache.
+    """
+    cache_key = get_mistral_cache_key(original_title, original_content_raw, category_name)
+    cached_result = mistral_cache.pop(cache_key, None)
+    if cached_result is not None:
+        mistral_cache[cache_key] = cached_result
+    return cached_result
+
+def is_usable_cache_entry(cached_result, expires_before):
+    """
+    True if a cache entry read from disk has the shape get_mistral_summaries_and_images writes
+    (string summary and image URL, numeric "cachedAt") and hasn't expired yet.
+    """
+    if not isinstance(cached_result, dict):
+        return False
+    cached_at = cached_result.get('cachedAt')
+    if not isinstance(cached_at, (int, float)) or isinstance(cached_at, bool):
+        return False
+    return (
+        cached_at >= expires_before
+        and isinstance(cached_result.get('summary'), str)
+        and isinstance(cached_result.get('imageUrl'), str)
+    )
+
+def load_mistral_cache():
+    """
+    Loads previously cached Mistral AI results from disk, if any, skipping entries that have
+    expired, were cached before entries recorded their age, or are malformed. The workflow saves
+    the cache back after every run, so a bad entry is dropped here rather than failing every run.
+    """
+    if not os.path.exists(MISTRAL_CACHE_FILE_PATH):
+        print(f"No existing {MISTRAL_CACHE_FILE_PATH} found. Starting with an empty Mistral AI cache.")
+        return
+    try:
+        with open(MISTRAL_CACHE_FILE_PATH, 'rb') as f:
+            cached_results = json_loads(f.read())
+        if not isinstance(cached_results, dict):
+            print(f"{MISTRAL_CACHE_FILE_PATH} does not hold a JSON object. Starting with an empty Mistral AI cache.")
+            return
+        expires_before = time.time() - MISTRAL_CACHE_TTL_DAYS * 86400
+        mistral_cache.update(
+            (cache_key, cached_result) for cache_key, cached_result in cached_results.items()
+            if is_usable_cache_entry(cached_result, expires_before)
+        )
+        print(f"Loaded {len(mistral_cache)} cached Mistral AI results from {MISTRAL_CACHE_FILE_PATH} ({len(cached_results) - len(mistral_cache)} expired or malformed)")
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"Error reading {MISTRAL_CACHE_FILE_PATH}: {e}. Starting with an empty Mistral AI cache.")
+        mistral_cache.clear()
+
+def serialize_mistral_cache():
+    """
+    Evicts the least recently used entries beyond MISTRAL_CACHE_MAX_ENTRIES and returns the
+    (serialized cache, entry count) arguments of write_mistral_cache. Call it on the event loop
+    thread, where no other task can modify the cache meanwhile.
+    """
+    for cache_key in list(mistral_cache)[:max(0, len(mistral_cache) - MISTRAL_CACHE_MAX_ENTRIES)]:
+        del mistral_cache[cache_key]
+    return json_dumps(mistral_cache), len(mistral_cache) # Compact: the cache is never read by people
+
+def write_mistral_cache(data, entry_count):
+    """
+    Writes a serialized Mistral AI cache to disk via a temporary file and an atomic rename.
+    Touches no shared state, so it can run in a worker thread.
+    """
+    try:
+        write_file_atomically(MISTRAL_CACHE_FILE_PATH, data)
+        print(f"Saved {entry_count} cached Mistral AI results to {MISTRAL_CACHE_FILE_PATH}")
+    except IOError as e:
+        print(f"Error writing Mistral AI cache {MISTRAL_CACHE_FILE_PATH}: {e}")
+
+def save_mistral_cache():
+    """Persists the Mistral AI cache to disk, for callers with nothing else running."""
+    write_mistral_cache(*serialize_mistral_cache())
+
+def select_image_url(original_image_url_raw, suggested_image_url):
+    """Prefers the article's own image, then the image suggested by Mistral AI, then a placeholder."""
+    if original_image_url_raw and original_image_url_raw.startswith(('http://', 'https://')):
+        return original_image_url_raw
+    if suggested_image_url.startswith(('http://', 'https://')):
+        return suggested_image_url
+    return "https://placehold.co/600x400/CCCCCC/333333?text=AI+Image+Fallback"
+
+def get_retry_delay(headers, attempt):
+    """
+    Honors the Retry-After header (in seconds) when present, otherwise backs off exponentially:
+    1s, 2s, 4s, ... up to MISTRAL_MAX_RETRY_DELAY_SECONDS, plus up to 1s of random jitter so the
+    concurrently processed categories that failed together don't all retry at the same moment.
+    """
+    retry_after = headers.get('Retry-After') if headers else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return min(2 ** attempt, MISTRAL_MAX_RETRY_DELAY_SECONDS) + random.random()
+
+def estimate_mistral_tokens(payload, article_count):
+    """Roughly estimates the tokens a request will use, prompt and reply, for the per-minute budget."""
+    prompt_chars = sum(len(message['content']) for message in payload['messages'])
+    return prompt_chars // MISTRAL_CHARS_PER_TOKEN + article_count * MISTRAL_REPLY_TOKENS_PER_ARTICLE
+
+def index_batch_results(batch_results):
+    """
+    Maps each entry of a batched Mistral AI response to the id of the article it belongs to.
+    Entries are matched by the "id" echoed back from the prompt, not by position, so a reply
+    that reorders or skips articles can't attach a summary to the wrong article. Entries
+    without a usable id fall back to their position in the list.
+    Each entry is validated once here and reduced to a (summary, suggested_image_url) pair of
+    strings, with "" for a missing or non-string field.
+    """
+    results_by_id = {}
+    if not isinstance(batch_results, list):
+        return results_by_id
+    for position, item in enumerate(batch_results):
+        if not isinstance(item, dict):
+            continue
+        try:
+            article_id = int(item.get('id', position))
+        except (TypeError, ValueError):
+            article_id = position
+        summary = item.get('summary')
+        suggested_image_url = item.get('suggestedImageUrl')
+        results_by_id.setdefault(article_id, (
+            summary if isinstance(summary, str) else "",
+            suggested_image_url if isinstance(suggested_image_url, str) else ""
+        ))
+    return results_by_id
+
+def create_mistral_client():
+    """
+    Creates the httpx client used for every Mistral AI request in a run. It speaks HTTP/2, so
+    concurrent requests are multiplexed over a single kept-alive TLS connection instead of each
+    paying for its own handshake. The base URL and auth headers are set once for the client.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        base_url=MISTRAL_API_BASE_URL,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+        headers=MISTRAL_HEADERS,
+        timeout=60
+    )
+
+async def read_mistral_stream(response):
+    """
+    Assembles the message content from a streamed Mistral AI chat completion, one
+    "data: {...}" event per token delta, until the "data: [DONE]" event.
+    Raises MistralOutputError as soon as the content starts with anything but "{".
+    """
+    content_parts = []
+    async for line in response.aiter_lines():
+        if not line.startswith('data: '):
+            continue
+        data = line[len('data: '):]
+        if data == '[DONE]':
+            break
+        choices = json_loads(data).get('choices') or [{}]
+        delta = (choices[0].get('delta') or {}).get('content')
+        if not delta:
+            continue
+        if not content_parts:
+            delta = delta.lstrip()
+            if not delta:
+                continue
+            if not delta.startswith('{'):
+                raise MistralOutputError(f"Streamed reply is not a JSON object: {delta[:80]!r}")
+        content_parts.append(delta)
+    return ''.join(content_parts)
+
+async def post_to_mistral(client, payload, estimated_tokens):
+    """
+    Sends a streamed chat completion request to Mistral AI and returns the assembled message content.
+    Rate-limited (429), server-side (5xx) and network errors are retried with exponential
+    backoff before the last error is raised, so a transient failure doesn't turn a whole
+    batch of articles into simulated fallbacks. A 429 also pauses the shared rate limiter for
+    the retry delay, so the other in-flight categories back off too instead of drawing more 429s.
+    """
+    for attempt in range(MISTRAL_MAX_ATTEMPTS):
+        await mistral_rate_limiter.acquire()
+        await mistral_token_limiter.acquire(estimated_tokens)
+        retry_headers = None
+        try:
+            async with mistral_semaphore:
+                async with client.stream('POST', MISTRAL_CHAT_COMPLETIONS_PATH, json=payload) as response:
+                    if response.status_code >= 400:
+                        await response.aread()
+                        print(f"Mistral AI API Error Response ({response.status_code}): {response.text}")
+                        retry_headers = response.headers
+                    response.raise_for_status()
+                    return await read_mistral_stream(response)
+        except httpx.HTTPStatusError as e:
+            retryable = e.response.status_code in MISTRAL_RETRY_STATUS_CODES
+            error = e
+        except httpx.TransportError as e: # Connection errors and timeouts
+            retryable = True
+            error = e
+        if not retryable or attempt == MISTRAL_MAX_ATTEMPTS - 1:
+            raise error
+        delay = get_retry_delay(retry_headers, attempt)
+        if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429:
+            mistral_rate_limiter.pause(delay)
+        print(f"Mistral AI API request failed: {type(error).__name__}: {error}. Retrying in {delay:.1f}s (attempt {attempt + 2}/{MISTRAL_MAX_ATTEMPTS})...")
+        await asyncio.sleep(delay)
+
+async def get_mistral_summaries_and_images(client, articles_raw, category_name):
+    """
+    Uses Mistral AI API to summarize a batch of articles and suggest a relevant image URL for each,
+    all in a single request. This function processes real data from NewsAPI.org or World News API.
+    Returns one (summary, image_url, processing_failed) tuple per article, in the same order.
+    """
+    articles_for_prompt = [
+        {
+            "id": i,
+            "title": article_raw.title,
+            "content": article_raw.content_raw,
+            "imageUrl": article_raw.imageUrl_raw or ""
+        }
+        for i, article_raw in enumerate(articles_raw)
+    ]
+    prompt = MISTRAL_USER_PROMPT_TEMPLATE.format(
+        category=category_name,
+        articles=json.dumps(articles_for_prompt, ensure_ascii=False)
+    )
+
+    payload = {
+        **MISTRAL_BASE_PAYLOAD,
+        "messages": [
+            MISTRAL_SYSTEM_MESSAGE,
+            {"role": "user", "content": prompt}
+        ]
+    }
+
+    def failed_results(fallback_image_url):
+        return [(article_raw.content_raw, article_raw.imageUrl_raw or fallback_image_url, True) for article_raw in articles_raw]
+
+    json_string = None
+    try:
+        json_string = await post_to_mistral(client, payload, estimate_mistral_tokens(payload, len(articles_raw)))
+        
+        logger.debug("Raw Mistral AI response for %s '%s' articles: %s", len(articles_raw), category_name, json_string)
+
+        if json_string:
+            parsed_json = json_loads(json_string)
+            results_by_id = index_batch_results(parsed_json.get('results', []))
+
+            processed_results = []
+            for i, article_raw in enumerate(articles_raw):
+                batch_result = results_by_id.get(i)
+                if not batch_result:
+                    print(f"Mistral AI API response missing a result for '{article_raw.title}'.")
+                    processed_results.append((article_raw.content_raw, article_raw.imageUrl_raw or 'https://placehold.co/600x400/CCCCCC/333333?text=AI+Process+Failed', True))
+                    continue
+
+                summary, suggested_image_url = batch_result
+                summary = summary or article_raw.content_raw
+                final_image_url = select_image_url(article_raw.imageUrl_raw, suggested_image_url)
+
+                mistral_cache[get_mistral_cache_key(article_raw.title, article_raw.content_raw, category_name)] = {
+                    "summary": summary,
+                    "imageUrl": final_image_url,
+                    "cachedAt": int(time.time())
+                }
+                processed_results.append((summary, final_image_url, False)) # Mistral successfully processed
+            return processed_results
+        else:
+            print(f"Mistral AI API response missing expected structure for {len(articles_raw)} '{category_name}' articles: empty streamed reply")
+            return failed_results('https://placehold.co/600x400/CCCCCC/333333?text=AI+Process+Failed')
+
+    except httpx.HTTPError as e:
+        print(f"Error calling Mistral AI API for {len(articles_raw)} '{category_name}' articles: {type(e).__name__}: {e}")
+        return failed_results('https://placehold.co/600x400/CCCCCC/333333?text=API+Error+Image')
+    except (json.JSONDecodeError, MistralOutputError) as e:
+        print(f"Error decoding Mistral AI API JSON response for {len(articles_raw)} '{category_name}' articles: {e}")
+        if json_string:
+            print(f"Raw Mistral AI response text: {json_string}")
+        return failed_results('https://placehold.co/600x400/CCCCCC/333333?text=JSON+Error+Image')